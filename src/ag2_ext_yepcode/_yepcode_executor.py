@@ -1,8 +1,15 @@
 """YepCode code executor implementation."""
 
+import asyncio
+import hashlib
+import io
+import itertools
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import ClassVar, List, Optional
+from typing import Any, ClassVar, Dict, List, Optional, Tuple
 
 from autogen.coding import (
     CodeBlock,
@@ -11,20 +18,56 @@ from autogen.coding import (
     CodeExtractor,
     MarkdownCodeExtractor,
 )
-from pydantic import BaseModel, Field
-from typing_extensions import Self
 
 try:
     from dotenv import load_dotenv
 except ImportError:
     load_dotenv = None
 
-try:
-    from yepcode_run import YepCodeRun, YepCodeApiConfig
-except ImportError as e:
-    raise RuntimeError(
-        "Missing dependencies for YepCodeCodeExecutor. Please install with: pip install yepcode-run"
-    ) from e
+# The yepcode-run SDK is imported lazily on first executor construction, so
+# importing this package stays cheap for consumers that never execute code.
+YepCodeRun = None
+YepCodeApiConfig = None
+
+# Whether the .env fallback has already run; loading is at most once per
+# process even when executors are constructed in a loop.
+_DOTENV_LOADED = False
+
+
+def _load_yepcode_run() -> None:
+    """Import the yepcode-run SDK on first use."""
+    global YepCodeRun, YepCodeApiConfig
+    if YepCodeRun is not None:
+        return
+    try:
+        from yepcode_run import YepCodeRun as _YepCodeRun
+        from yepcode_run import YepCodeApiConfig as _YepCodeApiConfig
+    except ImportError as e:
+        raise RuntimeError(
+            "Missing dependencies for YepCodeCodeExecutor. Please install with: pip install yepcode-run"
+        ) from e
+    YepCodeRun = _YepCodeRun
+    YepCodeApiConfig = _YepCodeApiConfig
+
+
+# Cache of YepCodeRun clients keyed by API token, so constructing several
+# executors with the same token does not repeat auth/session setup.
+# Note: HTTP connection reuse itself is up to the SDK — yepcode-run issues
+# module-level requests calls and exposes no session/adapter hook to inject
+# a pooled keep-alive session from here.
+_RUNNER_CACHE: Dict[str, "YepCodeRun"] = {}
+_RUNNER_CACHE_LOCK = threading.Lock()
+
+
+class _BlockError(Exception):
+    """Aborts a batch, carrying the failing execution's output and ID."""
+
+    __slots__ = ("msg", "execution_id")
+
+    def __init__(self, msg: str, execution_id: Optional[str] = None):
+        super().__init__(msg)
+        self.msg = msg
+        self.execution_id = execution_id
 
 
 class YepCodeCodeResult(CodeResult):
@@ -34,19 +77,30 @@ class YepCodeCodeResult(CodeResult):
     """The YepCode execution ID for this result."""
 
 
-class YepCodeCodeExecutorConfig(BaseModel):
+@dataclass(slots=True)
+class YepCodeCodeExecutorConfig:
     """Configuration for YepCodeCodeExecutor"""
 
-    api_token: Optional[str] = Field(default=None, description="YepCode API token")
-    timeout: int = Field(
-        default=60, description="Timeout in seconds for code execution"
-    )
-    remove_on_done: bool = Field(
-        default=False, description="Remove execution after completion"
-    )
-    sync_execution: bool = Field(
-        default=True, description="Wait for execution to complete"
-    )
+    api_token: Optional[str] = None
+    """YepCode API token."""
+
+    timeout: int = 60
+    """Timeout in seconds for code execution."""
+
+    remove_on_done: bool = False
+    """Remove execution after completion."""
+
+    sync_execution: bool = True
+    """Wait for execution to complete."""
+
+    cache: bool = True
+    """Reuse results of previously executed code blocks."""
+
+    fuse_blocks: bool = True
+    """Run consecutive same-language code blocks in one execution."""
+
+    max_concurrent: int = 8
+    """Maximum number of code blocks executing concurrently."""
 
 
 class YepCodeCodeExecutor(CodeExecutor):
@@ -55,8 +109,11 @@ class YepCodeCodeExecutor(CodeExecutor):
     This executor runs code in YepCode's secure, production-grade sandboxes.
     It supports Python and JavaScript execution with access any external library with automatic discovery and installation.
 
-    The executor executes code blocks serially in the order they are received.
-    Each code block is executed in a separate YepCode execution environment.
+    The executor submits all code blocks up front and then waits for their
+    completions, so the blocks of a message run concurrently on YepCode's side.
+    Consecutive blocks in the same language are fused into one execution by
+    default (see ``fuse_blocks``), and outputs are reported in the order the
+    blocks were received, one per execution.
     Currently supports Python and JavaScript languages.
 
     Args:
@@ -64,26 +121,56 @@ class YepCodeCodeExecutor(CodeExecutor):
         timeout (int): The timeout for code execution in seconds. Default is 60.
         remove_on_done (bool): Whether to remove the execution after completion. Default is False.
         sync_execution (bool): Whether to wait for execution to complete. Default is True.
+        cache (bool): Whether to reuse the results of previously executed code blocks
+            instead of re-executing them remotely. Default is True.
+        fuse_blocks (bool): Whether to run consecutive same-language code blocks in a
+            single execution, amortizing the sandbox startup across them. Default is True.
+        max_concurrent (int): Maximum number of code blocks executing concurrently.
+            Default is 8.
     """
 
     SUPPORTED_LANGUAGES: ClassVar[List[str]] = ["python", "javascript"]
 
+    _SUPPORTED: ClassVar[frozenset] = frozenset(SUPPORTED_LANGUAGES)
+
+    _LANG_MAP: ClassVar[Dict[str, str]] = {
+        "js": "javascript",
+        "javascript": "javascript",
+        "py": "python",
+        "python": "python",
+    }
+
+    _CACHE_MAXSIZE: ClassVar[int] = 128
+
+    _MAX_LOG_CHARS: ClassVar[int] = 256 * 1024
+
+    # Stateless, so one instance serves every executor and message
+    _EXTRACTOR: ClassVar[MarkdownCodeExtractor] = MarkdownCodeExtractor()
+
     def __init__(
         self,
         api_token: Optional[str] = None,
         timeout: int = 60,
         remove_on_done: bool = False,
         sync_execution: bool = True,
+        cache: bool = True,
+        fuse_blocks: bool = True,
+        max_concurrent: int = 8,
     ):
         if timeout < 1:
             raise ValueError("Timeout must be greater than or equal to 1.")
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be greater than or equal to 1.")
 
-        # Load environment variables from .env file if dotenv is available
-        if load_dotenv is not None:
-            load_dotenv()
-
-        # Get API token from parameter or environment
+        # Get API token from parameter or environment; only fall back to
+        # parsing a .env file when neither provides one.
         self._api_token = api_token or os.getenv("YEPCODE_API_TOKEN")
+        if not self._api_token and load_dotenv is not None:
+            global _DOTENV_LOADED
+            if not _DOTENV_LOADED:
+                load_dotenv()
+                _DOTENV_LOADED = True
+            self._api_token = os.getenv("YEPCODE_API_TOKEN")
         if not self._api_token:
             raise ValueError(
                 "YepCode API token is required. Provide it via api_token parameter or YEPCODE_API_TOKEN environment variable."
@@ -92,17 +179,41 @@ class YepCodeCodeExecutor(CodeExecutor):
         self._timeout = timeout
         self._remove_on_done = remove_on_done
         self._sync_execution = sync_execution
+        self._cache_enabled = cache
+        self._fuse_blocks = fuse_blocks
+        self._max_concurrent = max_concurrent
+        # Pre-built run options per language; only the language varies per
+        # block. The SDK installs cleanup callbacks into the dict when
+        # removeOnDone is set, so that case gets a fresh copy per call.
+        self._run_opts: Dict[str, Dict[str, Any]] = {
+            lang: {
+                "language": lang,
+                "removeOnDone": remove_on_done,
+                "timeout": timeout * 1000,  # Convert to milliseconds
+            }
+            for lang in self.SUPPORTED_LANGUAGES
+        }
+        # LRU cache of (output, execution_id) per (language, code digest)
+        self._result_cache: OrderedDict[Tuple[str, bytes], Tuple[str, str]] = (
+            OrderedDict()
+        )
 
+        _load_yepcode_run()
         try:
-            config = YepCodeApiConfig(api_token=self._api_token)
-            self._runner = YepCodeRun(config)
+            with _RUNNER_CACHE_LOCK:
+                runner = _RUNNER_CACHE.get(self._api_token)
+                if runner is None:
+                    config = YepCodeApiConfig(api_token=self._api_token)
+                    runner = YepCodeRun(config)
+                    _RUNNER_CACHE[self._api_token] = runner
+            self._runner = runner
         except Exception as e:
             raise RuntimeError(f"Failed to initialize YepCode runner: {str(e)}") from e
 
     @property
     def code_extractor(self) -> CodeExtractor:
         """(Experimental) Export a code extractor that can be used by an agent."""
-        return MarkdownCodeExtractor()
+        return self._EXTRACTOR
 
     @property
     def timeout(self) -> int:
@@ -112,12 +223,36 @@ class YepCodeCodeExecutor(CodeExecutor):
     def _normalize_language(self, language: str) -> str:
         """Normalize language name to YepCode format."""
         lang = language.lower()
-        if lang in ["js", "javascript"]:
-            return "javascript"
-        elif lang in ["python", "py"]:
-            return "python"
-        else:
-            return lang
+        return self._LANG_MAP.get(lang, lang)
+
+    def _fuse_code_blocks(
+        self, code_blocks: List[CodeBlock], langs: List[str]
+    ) -> List[Tuple[str, str]]:
+        """Group the blocks into (language, code) execution units.
+
+        Consecutive blocks in the same language are concatenated into one
+        unit, so a message with several adjacent blocks pays a single
+        sandbox startup instead of one per block.
+        """
+        units: List[Tuple[str, str]] = []
+        for lang, group in itertools.groupby(
+            zip(code_blocks, langs), key=lambda pair: pair[1]
+        ):
+            blocks = [code_block for code_block, _ in group]
+            if len(blocks) == 1:
+                units.append((lang, blocks[0].code))
+            else:
+                marker = "#" if lang == "python" else "//"
+                units.append(
+                    (
+                        lang,
+                        "\n\n".join(
+                            f"{marker} --- block {number} ---\n{code_block.code}"
+                            for number, code_block in enumerate(blocks, start=1)
+                        ),
+                    )
+                )
+        return units
 
     def execute_code_blocks(self, code_blocks: List[CodeBlock]) -> YepCodeCodeResult:
         """Execute the code blocks and return the result.
@@ -128,76 +263,189 @@ class YepCodeCodeExecutor(CodeExecutor):
         Returns:
             YepCodeCodeResult: The result of the code execution.
         """
-        if not code_blocks:
-            return YepCodeCodeResult(exit_code=0, output="")
-
-        outputs: List[str] = []
-        last_execution_id: Optional[str] = None
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.a_execute_code_blocks(code_blocks))
+        # Called from inside a running event loop (AG2's async reply path
+        # invokes this sync method directly); asyncio.run would raise here,
+        # so run the coroutine on its own loop in a worker thread.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            return pool.submit(
+                asyncio.run, self.a_execute_code_blocks(code_blocks)
+            ).result()
+
+    async def a_execute_code_blocks(
+        self, code_blocks: List[CodeBlock]
+    ) -> YepCodeCodeResult:
+        """Execute the code blocks asynchronously and return the result.
+
+        Blocks are submitted in order and their completions are awaited
+        concurrently, so the wait phase costs the slowest block rather than
+        the sum of all of them.
 
-        for code_block in code_blocks:
-            lang = self._normalize_language(code_block.language)
+        Args:
+            code_blocks (List[CodeBlock]): The code blocks to execute.
 
-            if lang not in ["python", "javascript"]:
-                return YepCodeCodeResult(
+        Returns:
+            YepCodeCodeResult: The result of the code execution.
+        """
+        if not code_blocks:
+            return YepCodeCodeResult.model_construct(exit_code=0, output="")
+
+        # Validate every language before submitting anything, so a bad block
+        # cannot leave earlier blocks running remotely.
+        langs = [self._normalize_language(block.language) for block in code_blocks]
+        for code_block, lang in zip(code_blocks, langs):
+            if lang not in self._SUPPORTED:
+                return YepCodeCodeResult.model_construct(
                     exit_code=1,
                     output=f"Unsupported language: {code_block.language}. Supported languages: {', '.join(self.SUPPORTED_LANGUAGES)}",
                 )
 
-            try:
-                # Execute code using YepCode
-                execution = self._runner.run(
-                    code_block.code,
-                    {
-                        "language": lang,
-                        "removeOnDone": self._remove_on_done,
-                        "timeout": self._timeout * 1000,  # Convert to milliseconds
-                    },
-                )
-
-                last_execution_id = execution.id
+        use_cache = self._cache_enabled and self._sync_execution
 
-                if self._sync_execution:
-                    # Wait for execution to complete
-                    execution.wait_for_done()
-
-                    logs_output = ""
-                    # Get logs
-                    if execution.logs:
-                        logs_output = "\n\nExecution logs:\n" + "\n".join(
-                            [
-                                f"{log.timestamp} - {log.level}: {log.message}"
-                                for log in execution.logs
-                            ]
-                        )
-
-                    # Check if execution was successful
-                    if execution.error:
-                        output = f"Execution failed with error:\n{execution.error}{logs_output}"
+        # Group consecutive same-language blocks into single execution units
+        # so a message of adjacent blocks pays one sandbox startup.
+        if self._fuse_blocks:
+            units = self._fuse_code_blocks(code_blocks, langs)
+        else:
+            units = [
+                (lang, code_block.code)
+                for code_block, lang in zip(code_blocks, langs)
+            ]
 
-                        return YepCodeCodeResult(
-                            exit_code=1, output=output, execution_id=execution.id
-                        )
+        try:
+            return await self._a_run_units(units, use_cache)
+        except _BlockError as e:
+            return YepCodeCodeResult.model_construct(
+                exit_code=1, output=e.msg, execution_id=e.execution_id
+            )
 
-                    # Get output
-                    output = ""
-                    if execution.return_value:
-                        output = f"Execution result:\n{execution.return_value}"
+    async def _a_run_units(
+        self, units: List[Tuple[str, str]], use_cache: bool
+    ) -> YepCodeCodeResult:
+        """Submit the execution units, await completions, and assemble the result.
 
-                    output += logs_output
+        Raises:
+            _BlockError: If any unit fails to submit or execute.
+        """
+        outputs: List[Optional[str]] = [None] * len(units)
+        execution_ids: List[Optional[str]] = [None] * len(units)
+        pending = []  # (unit index, cache key, task)
+
+        # Each unit runs end-to-end in its own worker thread: the SDK's
+        # run() blocks until the execution finishes (and wait_for_done
+        # re-polls the API; there is no long-poll or streaming wait), so
+        # submission itself must be concurrent for units to overlap. The
+        # semaphore keeps the number of in-flight executions bounded.
+        semaphore = asyncio.Semaphore(self._max_concurrent)
+
+        async def run_unit(lang: str, code: str):
+            opts = self._run_opts[lang]
+            if self._remove_on_done:
+                opts = dict(opts)
+
+            async with semaphore:
+                try:
+                    execution = await asyncio.to_thread(self._runner.run, code, opts)
+                except Exception as e:
+                    raise _BlockError(f"Error executing code: {str(e)}") from e
+                if self._sync_execution:
+                    try:
+                        await asyncio.to_thread(execution.wait_for_done)
+                    except Exception as e:
+                        raise _BlockError(
+                            f"Error executing code: {str(e)}", execution.id
+                        ) from e
+                return execution
 
-                    outputs.append(output)
-                else:
-                    outputs.append(f"Execution started with ID: {execution.id}")
+        try:
+            async with asyncio.TaskGroup() as tg:
+                for index, (lang, code) in enumerate(units):
+                    # Fire-and-forget submissions are never cached, so skip
+                    # the key digest entirely on that path.
+                    key = None
+                    if use_cache:
+                        key = (
+                            lang,
+                            hashlib.blake2b(code.encode(), digest_size=16).digest(),
+                        )
+                        if key in self._result_cache:
+                            self._result_cache.move_to_end(key)
+                            outputs[index], execution_ids[index] = (
+                                self._result_cache[key]
+                            )
+                            continue
+                    pending.append(
+                        (index, key, tg.create_task(run_unit(lang, code)))
+                    )
+        except* _BlockError as eg:
+            raise eg.exceptions[0]
+
+        if not self._sync_execution:
+            return YepCodeCodeResult.model_construct(
+                exit_code=0,
+                output="\n===\n".join(
+                    f"Execution started with ID: {task.result().id}"
+                    for _, _, task in pending
+                ),
+                execution_id=pending[-1][2].result().id if pending else None,
+            )
 
-            except Exception as e:
-                return YepCodeCodeResult(
-                    exit_code=1,
-                    output=f"Error executing code: {str(e)}",
-                    execution_id=last_execution_id,
+        # Collect outputs in unit order now that every task has finished.
+        for index, key, task in pending:
+            execution = task.result()
+
+            # Bind the log buffer once and cap the formatted size, so a
+            # log-heavy execution cannot blow up the result payload.
+            logs_output = ""
+            logs = getattr(execution, "logs", None)
+            if logs:
+                lines: List[str] = []
+                size = 0
+                for count, log in enumerate(logs):
+                    line = "%s - %s: %s" % (log.timestamp, log.level, log.message)
+                    size += len(line) + 1
+                    if size > self._MAX_LOG_CHARS:
+                        lines.append("... [truncated %d lines]" % (len(logs) - count))
+                        break
+                    lines.append(line)
+                logs_output = "\n\nExecution logs:\n" + "\n".join(lines)
+
+            # Check if execution was successful
+            if execution.error:
+                raise _BlockError(
+                    f"Execution failed with error:\n{execution.error}{logs_output}",
+                    execution.id,
                 )
 
-        return YepCodeCodeResult(
-            exit_code=0, output="\n===\n".join(outputs), execution_id=last_execution_id
+            # Get output
+            output = ""
+            if execution.return_value:
+                output = f"Execution result:\n{execution.return_value}"
+
+            output += logs_output
+
+            outputs[index] = output
+            execution_ids[index] = execution.id
+            if use_cache:
+                self._result_cache[key] = (output, execution.id)
+                if len(self._result_cache) > self._CACHE_MAXSIZE:
+                    self._result_cache.popitem(last=False)
+
+        # Assemble the final output incrementally; with multi-MB logs a
+        # plain join would briefly hold both the parts and the result.
+        buf = io.StringIO()
+        for number, output in enumerate(outputs):
+            if number:
+                buf.write("\n===\n")
+            buf.write(output)
+
+        return YepCodeCodeResult.model_construct(
+            exit_code=0,
+            output=buf.getvalue(),
+            execution_id=execution_ids[-1],
         )
 
     def restart(self) -> None:
@@ -1,163 +1,205 @@
 """Unit tests for YepCodeCodeExecutor."""
 
-import os
+import asyncio
+import re
 import pytest
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, MagicMock
-from typing import List
 
 from autogen.coding import CodeBlock, MarkdownCodeExtractor
 
 from ag2_ext_yepcode import YepCodeCodeExecutor, YepCodeCodeResult
+from ag2_ext_yepcode import _yepcode_executor
 
 
-class TestYepCodeCodeExecutor:
-    """Test suite for YepCodeCodeExecutor."""
+# Expected run options shared across the execution tests
+_BASE_OPTS_PY = {"language": "python", "removeOnDone": False, "timeout": 60000}
+_BASE_OPTS_JS = {"language": "javascript", "removeOnDone": False, "timeout": 60000}
 
-    def setup_method(self):
-        """Setup method run before each test."""
-        # Clear environment variables
-        if "YEPCODE_API_TOKEN" in os.environ:
-            del os.environ["YEPCODE_API_TOKEN"]
+# Pre-compiled match patterns for the constructor error tests
+_ERR_NO_TOKEN = re.compile(r"YepCode API token is required")
+_ERR_BAD_TIMEOUT = re.compile(r"Timeout must be greater than or equal to 1")
+_ERR_RUNNER = re.compile(r"Failed to initialize YepCode runner")
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_init_with_api_token(self, mock_config, mock_runner):
-        """Test initialization with API token provided."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
 
-        executor = YepCodeCodeExecutor(api_token="test_token")
+def _stub_execution(execution_id, return_value=None, error=None, logs=()):
+    """Build a completed-execution stand-in for the mocked runner."""
+    return SimpleNamespace(
+        id=execution_id,
+        error=error,
+        return_value=return_value,
+        logs=list(logs),
+        wait_for_done=Mock(),
+    )
 
-        assert executor._api_token == "test_token"
-        assert executor._timeout == 60
-        assert executor._remove_on_done is False
-        assert executor._sync_execution is True
-        mock_config.assert_called_once_with(api_token="test_token")
-        mock_runner.assert_called_once()
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_init_with_environment_token(self, mock_config, mock_runner):
-        """Test initialization with API token from environment."""
-        os.environ["YEPCODE_API_TOKEN"] = "env_token"
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
+@pytest.fixture(scope="class")
+def shared_executor():
+    """One pre-built executor for tests that only read its state."""
+    with patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig"), patch(
+        "ag2_ext_yepcode._yepcode_executor.YepCodeRun"
+    ):
+        yield YepCodeCodeExecutor(api_token="shared_token", timeout=120)
 
-        executor = YepCodeCodeExecutor()
 
-        assert executor._api_token == "env_token"
-        mock_config.assert_called_once_with(api_token="env_token")
-
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_init_with_custom_parameters(self, mock_config, mock_runner):
-        """Test initialization with custom parameters."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
-        executor = YepCodeCodeExecutor(
-            api_token="test_token",
-            timeout=120,
-            remove_on_done=True,
-            sync_execution=False,
+class TestYepCodeCodeExecutor:
+    """Test suite for YepCodeCodeExecutor."""
+
+    @pytest.fixture(autouse=True)
+    def _clean_state(self, monkeypatch):
+        """Isolate each test's token environment and module-level caches."""
+        monkeypatch.delenv("YEPCODE_API_TOKEN", raising=False)
+        # Clear the runner cache so each test gets its own mocked runner
+        _yepcode_executor._RUNNER_CACHE.clear()
+        # Allow the .env fallback to run again in each test
+        monkeypatch.setattr(_yepcode_executor, "_DOTENV_LOADED", False)
+
+    @pytest.fixture(autouse=True)
+    def mock_yepcode(self, monkeypatch):
+        """Patch the SDK entry points once for every test."""
+        mock_config = MagicMock()
+        mock_runner = MagicMock()
+        monkeypatch.setattr(
+            "ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig", mock_config
+        )
+        monkeypatch.setattr(
+            "ag2_ext_yepcode._yepcode_executor.YepCodeRun", mock_runner
         )
+        yield mock_config, mock_runner
+
+    def _execute(self, mock_yepcode, stub, code_blocks, **kwargs):
+        """Run ``code_blocks`` on an executor wired to the shared mock runner.
+
+        ``stub`` is either an execution stand-in returned for every run call
+        or a callable/exception installed as the run side effect.  Returns
+        the executor, its result and the runner's ``run`` mock so tests can
+        assert on the remote calls.
+        """
+        _, mock_runner = mock_yepcode
+        run = mock_runner.return_value.run
+        if callable(stub) or isinstance(stub, Exception):
+            run.side_effect = stub
+        else:
+            run.return_value = stub
+        executor = YepCodeCodeExecutor(api_token="test_token", **kwargs)
+        return executor, executor.execute_code_blocks(code_blocks), run
+
+    @pytest.mark.parametrize(
+        "env_token,kwargs,expected",
+        [
+            (
+                None,
+                {"api_token": "test_token"},
+                {
+                    "_api_token": "test_token",
+                    "_timeout": 60,
+                    "_remove_on_done": False,
+                    "_sync_execution": True,
+                },
+            ),
+            ("env_token", {}, {"_api_token": "env_token"}),
+            (
+                None,
+                {
+                    "api_token": "test_token",
+                    "timeout": 120,
+                    "remove_on_done": True,
+                    "sync_execution": False,
+                },
+                {
+                    "_api_token": "test_token",
+                    "_timeout": 120,
+                    "_remove_on_done": True,
+                    "_sync_execution": False,
+                },
+            ),
+        ],
+        ids=["api_token", "environment_token", "custom_parameters"],
+    )
+    def test_init_parameters(
+        self, mock_yepcode, monkeypatch, env_token, kwargs, expected
+    ):
+        """Test initialization from keyword arguments and the environment."""
+        mock_config, mock_runner = mock_yepcode
+        if env_token is not None:
+            monkeypatch.setenv("YEPCODE_API_TOKEN", env_token)
+
+        executor = YepCodeCodeExecutor(**kwargs)
+
+        for attr, value in expected.items():
+            assert getattr(executor, attr) == value
+        mock_config.assert_called_once_with(api_token=expected["_api_token"])
+        mock_runner.assert_called_once()
 
-        assert executor._api_token == "test_token"
-        assert executor._timeout == 120
-        assert executor._remove_on_done is True
-        assert executor._sync_execution is False
+    def test_init_reuses_cached_runner(self, mock_yepcode):
+        """Test that executors with the same token share one runner."""
+        _, mock_runner = mock_yepcode
 
-    @patch("ag2_ext_yepcode._yepcode_executor.load_dotenv")
-    def test_init_without_api_token(self, mock_load_dotenv):
-        """Test initialization without API token raises ValueError."""
-        # Ensure environment variable is not set
-        if "YEPCODE_API_TOKEN" in os.environ:
-            del os.environ["YEPCODE_API_TOKEN"]
+        executor1 = YepCodeCodeExecutor(api_token="test_token")
+        executor2 = YepCodeCodeExecutor(api_token="test_token")
 
-        # Mock dotenv to not load any variables
-        mock_load_dotenv.return_value = None
+        assert executor1._runner is executor2._runner
+        mock_runner.assert_called_once()
 
-        # Also clear any cached environment that might be loaded by dotenv
-        with patch.dict(os.environ, {}, clear=True):
-            with pytest.raises(ValueError, match="YepCode API token is required"):
-                YepCodeCodeExecutor()
+    def test_init_without_api_token(self, monkeypatch):
+        """Test initialization without API token raises ValueError."""
+        # _clean_state has already removed YEPCODE_API_TOKEN; keep the
+        # .env fallback from loading any variables
+        monkeypatch.setattr(
+            "ag2_ext_yepcode._yepcode_executor.load_dotenv", lambda *a, **k: None
+        )
+
+        with pytest.raises(ValueError, match=_ERR_NO_TOKEN):
+            YepCodeCodeExecutor()
 
     def test_init_with_invalid_timeout(self):
         """Test initialization with invalid timeout raises ValueError."""
-        with pytest.raises(
-            ValueError, match="Timeout must be greater than or equal to 1"
-        ):
+        with pytest.raises(ValueError, match=_ERR_BAD_TIMEOUT):
             YepCodeCodeExecutor(api_token="test_token", timeout=0)
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_init_runner_failure(self, mock_config, mock_runner):
+    def test_init_runner_failure(self, mock_yepcode):
         """Test initialization when YepCodeRun fails."""
-        mock_config.return_value = Mock()
+        _, mock_runner = mock_yepcode
         mock_runner.side_effect = Exception("API initialization failed")
 
-        with pytest.raises(RuntimeError, match="Failed to initialize YepCode runner"):
+        with pytest.raises(RuntimeError, match=_ERR_RUNNER):
             YepCodeCodeExecutor(api_token="test_token")
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_code_extractor_property(self, mock_config, mock_runner):
-        """Test code_extractor property returns MarkdownCodeExtractor."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+    def test_code_extractor_property(self, shared_executor):
+        """Test code_extractor property returns a memoized MarkdownCodeExtractor."""
+        assert isinstance(shared_executor.code_extractor, MarkdownCodeExtractor)
+        # The extractor is shared, not rebuilt per access
+        assert shared_executor.code_extractor is shared_executor.code_extractor
 
-        assert isinstance(executor.code_extractor, MarkdownCodeExtractor)
-
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_timeout_property(self, mock_config, mock_runner):
+    def test_timeout_property(self, shared_executor):
         """Test timeout property."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
-        executor = YepCodeCodeExecutor(api_token="test_token", timeout=120)
-
-        assert executor.timeout == 120
-
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_normalize_language(self, mock_config, mock_runner):
+        assert shared_executor.timeout == 120
+
+    @pytest.mark.parametrize(
+        "raw,expected",
+        [
+            ("python", "python"),
+            ("py", "python"),
+            ("Python", "python"),
+            ("javascript", "javascript"),
+            ("js", "javascript"),
+            ("JavaScript", "javascript"),
+            ("java", "java"),  # unsupported
+        ],
+    )
+    def test_normalize_language(self, shared_executor, raw, expected):
         """Test _normalize_language method."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
+        assert shared_executor._normalize_language(raw) == expected
 
-        executor = YepCodeCodeExecutor(api_token="test_token")
-
-        assert executor._normalize_language("python") == "python"
-        assert executor._normalize_language("py") == "python"
-        assert executor._normalize_language("Python") == "python"
-        assert executor._normalize_language("javascript") == "javascript"
-        assert executor._normalize_language("js") == "javascript"
-        assert executor._normalize_language("JavaScript") == "javascript"
-        assert executor._normalize_language("java") == "java"  # unsupported
-
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_empty_code_blocks(self, mock_config, mock_runner):
+    def test_execute_empty_code_blocks(self, shared_executor):
         """Test execute_code_blocks with empty list."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
-        result = executor.execute_code_blocks([])
+        result = shared_executor.execute_code_blocks([])
 
         assert result.exit_code == 0
         assert result.output == ""
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_unsupported_language(self, mock_config, mock_runner):
+    def test_execute_unsupported_language(self):
         """Test execute_code_blocks with unsupported language."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
         executor = YepCodeCodeExecutor(api_token="test_token")
         code_blocks = [CodeBlock(language="java", code="System.out.println('Hello');")]
         result = executor.execute_code_blocks(code_blocks)
@@ -165,139 +207,83 @@ class TestYepCodeCodeExecutor:
         assert result.exit_code == 1
         assert "Unsupported language: java" in result.output
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_successful_python_code(self, mock_config, mock_runner):
+    def test_execute_successful_python_code(self, mock_yepcode):
         """Test successful execution of Python code."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution
-        mock_execution = Mock()
-        mock_execution.id = "exec_123"
-        mock_execution.error = None
-        mock_execution.return_value = "Hello, World!"
-        mock_execution.logs = [
-            Mock(
-                timestamp="2023-01-01T00:00:00Z",
-                level="INFO",
-                message="Starting execution",
-            )
-        ]
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        mock_execution = _stub_execution(
+            "exec_123",
+            return_value="Hello, World!",
+            logs=[
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:00Z",
+                    level="INFO",
+                    message="Starting execution",
+                )
+            ],
+        )
         code_blocks = [CodeBlock(language="python", code="print('Hello, World!')")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, run = self._execute(mock_yepcode, mock_execution, code_blocks)
 
         assert result.exit_code == 0
         assert "Execution result:\nHello, World!" in result.output
         assert "Execution logs:" in result.output
         assert result.execution_id == "exec_123"
 
-        mock_runner_instance.run.assert_called_once_with(
-            "print('Hello, World!')",
-            {
-                "language": "python",
-                "removeOnDone": False,
-                "timeout": 60000,
-            },
-        )
+        run.assert_called_once_with("print('Hello, World!')", _BASE_OPTS_PY)
         mock_execution.wait_for_done.assert_called_once()
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_successful_javascript_code(self, mock_config, mock_runner):
+    def test_execute_successful_javascript_code(self, mock_yepcode):
         """Test successful execution of JavaScript code."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution
-        mock_execution = Mock()
-        mock_execution.id = "exec_456"
-        mock_execution.error = None
-        mock_execution.return_value = "42"
-        mock_execution.logs = []
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        mock_execution = _stub_execution("exec_456", return_value="42")
         code_blocks = [CodeBlock(language="javascript", code="console.log(42);")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, run = self._execute(mock_yepcode, mock_execution, code_blocks)
 
         assert result.exit_code == 0
         assert "Execution result:\n42" in result.output
         assert result.execution_id == "exec_456"
 
-        mock_runner_instance.run.assert_called_once_with(
-            "console.log(42);",
-            {
-                "language": "javascript",
-                "removeOnDone": False,
-                "timeout": 60000,
-            },
-        )
+        run.assert_called_once_with("console.log(42);", _BASE_OPTS_JS)
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_code_with_error(self, mock_config, mock_runner):
+    def test_execute_code_with_error(self, mock_yepcode):
         """Test execution with error."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution with error
-        mock_execution = Mock()
-        mock_execution.id = "exec_error"
-        mock_execution.error = "NameError: name 'undefined_var' is not defined"
-        mock_execution.logs = [
-            Mock(
-                timestamp="2023-01-01T00:00:00Z",
-                level="ERROR",
-                message="Execution failed",
-            )
-        ]
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        mock_execution = _stub_execution(
+            "exec_error",
+            error="NameError: name 'undefined_var' is not defined",
+            logs=[
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:00Z",
+                    level="ERROR",
+                    message="Execution failed",
+                )
+            ],
+        )
         code_blocks = [CodeBlock(language="python", code="print(undefined_var)")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, _ = self._execute(mock_yepcode, mock_execution, code_blocks)
 
         assert result.exit_code == 1
         assert "Execution failed with error:" in result.output
         assert "NameError: name 'undefined_var' is not defined" in result.output
         assert result.execution_id == "exec_error"
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_multiple_code_blocks(self, mock_config, mock_runner):
+    def test_execute_multiple_code_blocks(self, mock_yepcode):
         """Test execution of multiple code blocks."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock two executions
-        mock_execution1 = Mock()
-        mock_execution1.id = "exec_1"
-        mock_execution1.error = None
-        mock_execution1.return_value = "First result"
-        mock_execution1.logs = []
-
-        mock_execution2 = Mock()
-        mock_execution2.id = "exec_2"
-        mock_execution2.error = None
-        mock_execution2.return_value = "Second result"
-        mock_execution2.logs = []
-
-        mock_runner_instance.run.side_effect = [mock_execution1, mock_execution2]
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        # Blocks run concurrently, so map stubs by code instead of call order
+        executions_by_code = {
+            "print('First')": _stub_execution("exec_1", return_value="First result"),
+            "console.log('Second')": _stub_execution(
+                "exec_2", return_value="Second result"
+            ),
+        }
         code_blocks = [
             CodeBlock(language="python", code="print('First')"),
             CodeBlock(language="javascript", code="console.log('Second')"),
         ]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, run = self._execute(
+            mock_yepcode, lambda code, options: executions_by_code[code], code_blocks
+        )
 
         assert result.exit_code == 0
         assert "First result" in result.output
@@ -305,24 +291,112 @@ class TestYepCodeCodeExecutor:
         assert "===" in result.output  # Separator between outputs
         assert result.execution_id == "exec_2"  # Last execution ID
 
-        assert mock_runner_instance.run.call_count == 2
+        assert run.call_count == 2
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_async_execution(self, mock_config, mock_runner):
-        """Test asynchronous execution."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
+    def test_execute_fuses_consecutive_same_language_blocks(self, mock_yepcode):
+        """Test that adjacent same-language blocks run as one execution."""
+        mock_execution = _stub_execution("exec_fused", return_value="Fused result")
+        code_blocks = [
+            CodeBlock(language="python", code="x = 1"),
+            CodeBlock(language="python", code="print(x)"),
+        ]
 
-        # Mock execution
-        mock_execution = Mock()
-        mock_execution.id = "exec_async"
+        _, result, run = self._execute(mock_yepcode, mock_execution, code_blocks)
+
+        assert result.exit_code == 0
+        assert result.execution_id == "exec_fused"
+        run.assert_called_once()
+
+        fused_code = run.call_args[0][0]
+        assert "# --- block 1 ---\nx = 1" in fused_code
+        assert "# --- block 2 ---\nprint(x)" in fused_code
+
+    def test_execute_without_block_fusing(self, mock_yepcode):
+        """Test that fuse_blocks=False keeps one execution per block."""
+        mock_execution = _stub_execution("exec_single", return_value="Result")
+        code_blocks = [
+            CodeBlock(language="python", code="x = 1"),
+            CodeBlock(language="python", code="print(x)"),
+        ]
+
+        _, result, run = self._execute(
+            mock_yepcode, mock_execution, code_blocks, fuse_blocks=False
+        )
+
+        assert result.exit_code == 0
+        assert run.call_count == 2
+
+    def test_execute_repeated_block_uses_cache(self, mock_yepcode):
+        """Test that re-executing an identical block skips the remote call."""
+        mock_execution = _stub_execution("exec_cached", return_value="Cached result")
+        code_blocks = [CodeBlock(language="python", code="print('Hello')")]
+
+        executor, first, run = self._execute(mock_yepcode, mock_execution, code_blocks)
+        second = executor.execute_code_blocks(code_blocks)
+
+        assert first.exit_code == 0
+        assert second.exit_code == 0
+        assert second.output == first.output
+        assert second.execution_id == "exec_cached"
+        run.assert_called_once()
+
+    def test_execute_repeated_block_without_cache(self, mock_yepcode):
+        """Test that cache=False re-executes identical blocks."""
+        mock_execution = _stub_execution("exec_uncached", return_value="Result")
+        code_blocks = [CodeBlock(language="python", code="print('Hello')")]
+
+        executor, _, run = self._execute(
+            mock_yepcode, mock_execution, code_blocks, cache=False
+        )
+        executor.execute_code_blocks(code_blocks)
+
+        assert run.call_count == 2
+
+    def test_a_execute_code_blocks(self, mock_yepcode):
+        """Test the coroutine variant of execute_code_blocks."""
+        _, mock_runner = mock_yepcode
+        mock_runner_instance = mock_runner.return_value
+
+        mock_execution = _stub_execution("exec_coroutine", return_value="Async result")
         mock_runner_instance.run.return_value = mock_execution
 
-        executor = YepCodeCodeExecutor(api_token="test_token", sync_execution=False)
+        executor = YepCodeCodeExecutor(api_token="test_token")
         code_blocks = [CodeBlock(language="python", code="print('Hello')")]
-        result = executor.execute_code_blocks(code_blocks)
+        result = asyncio.run(executor.a_execute_code_blocks(code_blocks))
+
+        assert result.exit_code == 0
+        assert "Execution result:\nAsync result" in result.output
+        assert result.execution_id == "exec_coroutine"
+        mock_execution.wait_for_done.assert_called_once()
+
+    def test_execute_inside_running_event_loop(self, mock_yepcode):
+        """Test the sync API from inside a running event loop.
+
+        AG2's async reply path calls execute_code_blocks directly while its
+        own loop is running, so the sync wrapper must not use asyncio.run
+        on that loop.
+        """
+        mock_execution = _stub_execution("exec_loop", return_value="Loop result")
+        code_blocks = [CodeBlock(language="python", code="print('Hello')")]
+
+        async def call_sync():
+            return self._execute(mock_yepcode, mock_execution, code_blocks)
+
+        _, result, _ = asyncio.run(call_sync())
+
+        assert result.exit_code == 0
+        assert "Execution result:\nLoop result" in result.output
+        assert result.execution_id == "exec_loop"
+
+    def test_execute_async_execution(self, mock_yepcode):
+        """Test asynchronous execution."""
+        # Only id and wait_for_done are touched before the early return
+        mock_execution = SimpleNamespace(id="exec_async", wait_for_done=Mock())
+        code_blocks = [CodeBlock(language="python", code="print('Hello')")]
+
+        _, result, _ = self._execute(
+            mock_yepcode, mock_execution, code_blocks, sync_execution=False
+        )
 
         assert result.exit_code == 0
         assert "Execution started with ID: exec_async" in result.output
@@ -331,167 +405,130 @@ class TestYepCodeCodeExecutor:
         # Should not call wait_for_done in async mode
         mock_execution.wait_for_done.assert_not_called()
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_runtime_exception(self, mock_config, mock_runner):
+    def test_execute_runtime_exception(self, mock_yepcode):
         """Test execution with runtime exception."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock runtime exception
-        mock_runner_instance.run.side_effect = Exception("Runtime error")
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
         code_blocks = [CodeBlock(language="python", code="print('Hello')")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, _ = self._execute(
+            mock_yepcode, Exception("Runtime error"), code_blocks
+        )
 
         assert result.exit_code == 1
         assert "Error executing code: Runtime error" in result.output
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_with_custom_timeout(self, mock_config, mock_runner):
+    def test_execute_with_custom_timeout(self, mock_yepcode):
         """Test execution with custom timeout."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution
-        mock_execution = Mock()
-        mock_execution.id = "exec_timeout"
-        mock_execution.error = None
-        mock_execution.return_value = "Result"
-        mock_execution.logs = []
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token", timeout=120)
+        mock_execution = _stub_execution("exec_timeout", return_value="Result")
         code_blocks = [CodeBlock(language="python", code="print('Hello')")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, run = self._execute(
+            mock_yepcode, mock_execution, code_blocks, timeout=120
+        )
 
         assert result.exit_code == 0
 
         # Check that timeout was converted to milliseconds
-        mock_runner_instance.run.assert_called_once_with(
-            "print('Hello')",
-            {
-                "language": "python",
-                "removeOnDone": False,
-                "timeout": 120000,  # 120 seconds * 1000
-            },
+        run.assert_called_once_with(
+            "print('Hello')", {**_BASE_OPTS_PY, "timeout": 120000}
         )
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_with_remove_on_done(self, mock_config, mock_runner):
+    def test_execute_with_remove_on_done(self, mock_yepcode):
         """Test execution with remove_on_done enabled."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution
-        mock_execution = Mock()
-        mock_execution.id = "exec_remove"
-        mock_execution.error = None
-        mock_execution.return_value = "Result"
-        mock_execution.logs = []
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token", remove_on_done=True)
+        mock_execution = _stub_execution("exec_remove", return_value="Result")
         code_blocks = [CodeBlock(language="python", code="print('Hello')")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, run = self._execute(
+            mock_yepcode, mock_execution, code_blocks, remove_on_done=True
+        )
 
         assert result.exit_code == 0
 
         # Check that removeOnDone was set to True
-        mock_runner_instance.run.assert_called_once_with(
-            "print('Hello')",
-            {
-                "language": "python",
-                "removeOnDone": True,
-                "timeout": 60000,
-            },
+        run.assert_called_once_with(
+            "print('Hello')", {**_BASE_OPTS_PY, "removeOnDone": True}
         )
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_restart_method(self, mock_config, mock_runner):
+    def test_restart_method(self, shared_executor):
         """Test restart method (currently a no-op)."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
-
         # Should not raise any exception
-        executor.restart()
+        shared_executor.restart()
 
     @patch("ag2_ext_yepcode._yepcode_executor.load_dotenv")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_dotenv_loading(self, mock_config, mock_runner, mock_load_dotenv):
-        """Test that dotenv is loaded when available."""
-        mock_config.return_value = Mock()
-        mock_runner.return_value = Mock()
+    def test_dotenv_loading(self, mock_load_dotenv, monkeypatch):
+        """Test that dotenv is only consulted when no token is available."""
+        # An explicit token means the .env file is never touched
+        YepCodeCodeExecutor(api_token="test_token")
+        mock_load_dotenv.assert_not_called()
 
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        # Without a token anywhere, fall back to loading the .env file
+        def fake_load_dotenv(*args, **kwargs):
+            monkeypatch.setenv("YEPCODE_API_TOKEN", "dotenv_token")
+
+        mock_load_dotenv.side_effect = fake_load_dotenv
+        executor = YepCodeCodeExecutor()
 
+        assert executor._api_token == "dotenv_token"
         mock_load_dotenv.assert_called_once()
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_no_return_value(self, mock_config, mock_runner):
+    def test_execute_no_return_value(self, mock_yepcode):
         """Test execution with no return value."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution with no return value
-        mock_execution = Mock()
-        mock_execution.id = "exec_no_return"
-        mock_execution.error = None
-        mock_execution.return_value = None
-        mock_execution.logs = []
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        mock_execution = _stub_execution("exec_no_return")
         code_blocks = [CodeBlock(language="python", code="x = 1")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, _ = self._execute(mock_yepcode, mock_execution, code_blocks)
 
         assert result.exit_code == 0
         assert result.output == ""  # No return value and no logs means empty output
         assert result.execution_id == "exec_no_return"
 
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeRun")
-    @patch("ag2_ext_yepcode._yepcode_executor.YepCodeApiConfig")
-    def test_execute_no_return_value_with_logs(self, mock_config, mock_runner):
+    def test_execute_no_return_value_with_logs(self, mock_yepcode):
         """Test execution with no return value but with logs."""
-        mock_config.return_value = Mock()
-        mock_runner_instance = Mock()
-        mock_runner.return_value = mock_runner_instance
-
-        # Mock execution with no return value but with logs
-        mock_execution = Mock()
-        mock_execution.id = "exec_no_return_logs"
-        mock_execution.error = None
-        mock_execution.return_value = None
-        mock_execution.logs = [
-            Mock(
-                timestamp="2023-01-01T00:00:00Z",
-                level="INFO",
-                message="Some log message",
-            )
-        ]
-        mock_runner_instance.run.return_value = mock_execution
-
-        executor = YepCodeCodeExecutor(api_token="test_token")
+        mock_execution = _stub_execution(
+            "exec_no_return_logs",
+            logs=[
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:00Z",
+                    level="INFO",
+                    message="Some log message",
+                )
+            ],
+        )
         code_blocks = [CodeBlock(language="python", code="x = 1")]
-        result = executor.execute_code_blocks(code_blocks)
+
+        _, result, _ = self._execute(mock_yepcode, mock_execution, code_blocks)
 
         assert result.exit_code == 0
         assert "Execution logs:" in result.output
         assert "Some log message" in result.output
         assert result.execution_id == "exec_no_return_logs"
 
+    def test_execute_truncates_oversized_logs(self, mock_yepcode):
+        """Test that oversized execution logs are truncated in the output."""
+        # The second log line exceeds the output budget
+        big_message = "x" * YepCodeCodeExecutor._MAX_LOG_CHARS
+        mock_execution = _stub_execution(
+            "exec_big_logs",
+            logs=[
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:00Z", level="INFO", message="first"
+                ),
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:01Z", level="INFO", message=big_message
+                ),
+                SimpleNamespace(
+                    timestamp="2023-01-01T00:00:02Z", level="INFO", message="last"
+                ),
+            ],
+        )
+        code_blocks = [CodeBlock(language="python", code="print('Hello')")]
+
+        _, result, _ = self._execute(mock_yepcode, mock_execution, code_blocks)
+
+        assert result.exit_code == 0
+        assert "first" in result.output
+        assert "... [truncated 2 lines]" in result.output
+        assert "last" not in result.output
+
 
 class TestYepCodeCodeResult:
     """Test suite for YepCodeCodeResult."""